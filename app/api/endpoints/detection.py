@@ -15,25 +15,29 @@
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
 # Import necessary modules and dependencies
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
 from sqlalchemy.orm import Session
-from typing import List
-from DetectorService import DetectorService
-from app.models.database import get_db
+from typing import List, Optional
+from app.services.detector import DetectorService
+from app.models.database import get_db, SessionLocal
 from app.models import models
 from app.schemas import videos
 from app.core.config import get_settings
 from app.services.speech import SpeechService
+from app.services.wordlist import get_word_ids_cached
 
 # Create an API router and settings for video processing endpoints
 router = APIRouter()
 settings = get_settings()
 speech_service = SpeechService()
+logger = logging.getLogger(__name__)
 
 
 # Endpoint to process subtitle files for a given video ID
 @router.post("/process-srt/{video_id}", response_model=List[videos.DetectedWord])
-async def process_srt(video_id: int, db: Session = Depends(get_db)):
+async def process_srt(video_id: int, request: Request, db: Session = Depends(get_db)):
     # Fetch video details from the database if it hasn't been checked yet
     video = db.query(models.VideoInfo).filter(
         models.VideoInfo.id == video_id,
@@ -42,110 +46,209 @@ async def process_srt(video_id: int, db: Session = Depends(get_db)):
     if not video:
         raise HTTPException(status_code=404, detail="Video not found or already processed")
 
-    # Fetch the list of words to detect
-    words_list = db.query(models.WordsList).all()
-    if not words_list:
+    # Use the matcher built at start-up (and rebuilt by create_word) for the list of words to detect
+    matcher = request.app.state.profanity_matcher
+    if matcher is None:
         raise HTTPException(status_code=404, detail="No words to check")
 
-    # Prepare a list of words (strings) from the database records
-    word_strings = [word.words_detector for word in words_list]
-
     # Use the asynchronous method to process the SRT file
-    srt_detections = await DetectorService.check_srt_async(video.movie_srt_path, word_strings)
+    srt_detections = await DetectorService.check_srt_async(
+        video.movie_srt_path, matcher, request.app.state.scan_executor, request.app.state.scan_pool)
 
-    # srt_detections is a list of dicts:
-    db_detections = []
+    # srt_detections is a list of dicts, turn them into row mappings (words stored by id) and insert them in one batch
+    word_ids = get_word_ids_cached(db)
+    db_rows = []
     for detection in srt_detections:
-        db_detection = models.SrtDetectorWords(
-            movie_name=video.movie_name,
-            words=detection["word"],
-            srt_start_time=detection["start_time"],
-            srt_stop_time=detection["stop_time"])
-        db.add(db_detection)
-        db_detections.append(db_detection)
+        db_rows.append({
+            "video_id": video.id,
+            "movie_name": video.movie_name,
+            "word_id": word_ids[detection["word"]],
+            "srt_start_time": detection["start_time"],
+            "srt_stop_time": detection["stop_time"]})
+    db.bulk_insert_mappings(models.SrtDetectorWords, db_rows)
 
     # Mark the video as "checked" and save changes
     video.movie_check_status = "checked"
     db.commit()
 
-    return db_detections
-
-
-# Endpoint to process audio segments of a video based on SRT detections
-@router.post("/process-audio/{video_id}", response_model=List[videos.DetectedWord])
-async def process_audio(video_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    # Fetch video details if its subtitles have already been processed
+    # Return the detections in the shape of the DetectedWord schema
+    return [{
+        "movie_name": video.movie_name,
+        "words": detection["word"],
+        "start_time": detection["start_time"],
+        "stop_time": detection["stop_time"],
+    } for detection in srt_detections]
+
+
+# Background job that extracts the audio segments of a video and runs speech-to-text on them
+async def extract_audio_job(video_id: int, ffmpeg_semaphore: Optional[asyncio.Semaphore] = None) -> None:
+    # The job runs after the response was sent, so it uses its own database session
+    db = SessionLocal()
+    # Audio files written by this run that no committed row references yet
+    new_files = []
+    try:
+        video = db.query(models.VideoInfo).filter(models.VideoInfo.id == video_id).first()
+
+        # Fetch only the needed columns of the detections for the given video (no ORM objects are built),
+        # the word itself comes from the words list
+        detections = db.query(
+            models.SrtDetectorWords.word_id,
+            models.WordsList.words_detector,
+            models.SrtDetectorWords.srt_start_time,
+            models.SrtDetectorWords.srt_stop_time).join(
+            models.WordsList, models.SrtDetectorWords.word_id == models.WordsList.id).filter(
+            models.SrtDetectorWords.video_id == video.id).all()
+
+        # Convert detection rows into dictionaries expected by the async service method.
+        detection_dicts = []
+        for word_id, words, start_time, stop_time in detections:
+            detection_dicts.append({
+                "word_id": word_id,
+                "word": words,
+                "start_time": start_time,
+                "stop_time": stop_time,
+                # Optionally, include additional fields such as context if needed.
+            })
+
+        # Call the asynchronous method to extract audio segments concurrently.
+        audio_results = await DetectorService.extract_audio_segments(
+            video.movie_path, detection_dicts, video.movie_name, ffmpeg_semaphore)
+        new_files = [result["audio_path"] for result in audio_results]
+
+        # audio_results is a list of dictionaries that include an "audio_path" key along with the original detection data.
+        db_rows = []
+        for result in audio_results:
+            # Collect a row mapping for each processed audio segment.
+            db_rows.append({
+                "video_id": video.id,
+                "movie_name": video.movie_name,
+                "word_id": result["word_id"],
+                "movie_start_time": result["start_time"],
+                "movie_stop_time": result["stop_time"],
+                "sound_file_path": result["audio_path"]})
+
+        # A previous (failed) run of the job may have stored results already, replace them in the same
+        # transaction so a restarted job never duplicates rows
+        old_files = [path for (path,) in db.query(models.MovieDetectorWords.sound_file_path).filter(
+            models.MovieDetectorWords.video_id == video.id)]
+        db.query(models.MovieDetectorWords).filter(
+            models.MovieDetectorWords.video_id == video.id).delete(synchronize_session=False)
+        db.query(models.MovieSpeechResponse).filter(
+            models.MovieSpeechResponse.video_id == video.id).delete(synchronize_session=False)
+
+        # Insert all the processed audio segments in one batch and commit.
+        db.bulk_insert_mappings(models.MovieDetectorWords, db_rows)
+        db.commit()
+        new_files = []
+
+        # The audio files of the replaced rows are not referenced anymore
+        DetectorService.remove_files(old_files)
+
+        # Further process the audio (e.g., speech-to-text) once the segments are stored, all the words
+        # of the video in one call so their results are inserted in one batch and one commit
+        await speech_service.process_audio(
+            movie_name=video.movie_name,
+            words_list=[result["word"] for result in audio_results],
+            db=db,
+            video_id=video.id)
+
+        video.movie_check_status = "audio_processed"
+        db.commit()
+
+    except Exception as e:
+        # Record the failure so the status endpoint reports it and the job can be started again
+        logger.error(f"Error processing audio for video {video_id}: {str(e)}")
+        db.rollback()
+        DetectorService.remove_files(new_files)
+        db.query(models.VideoInfo).filter(models.VideoInfo.id == video_id).update(
+            {"movie_check_status": "audio_failed"})
+        db.commit()
+
+    finally:
+        db.close()
+
+
+# Endpoint to start processing the audio segments of a video based on SRT detections
+@router.post("/process-audio/{video_id}", response_model=videos.AudioJob, status_code=202)
+async def process_audio(video_id: int, request: Request, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    # Fetch video details if its subtitles have already been processed (or a previous audio job failed)
     video = db.query(models.VideoInfo).filter(
         models.VideoInfo.id == video_id,
-        models.VideoInfo.movie_check_status == "checked").first()
+        models.VideoInfo.movie_check_status.in_(["checked", "audio_failed"])).first()
 
     if not video:
         raise HTTPException(status_code=404, detail="Video not found or not processed by SRT")
 
-    # Fetch detections for the given video from the database
-    detections = db.query(models.SrtDetectorWords).filter(
-        models.SrtDetectorWords.movie_name == video.movie_name).all()
+    # Make sure there is something to extract before starting the job
+    has_detections = db.query(models.SrtDetectorWords.id).filter(
+        models.SrtDetectorWords.video_id == video.id).first()
 
-    if not detections:
+    if not has_detections:
         raise HTTPException(status_code=404, detail="No detections found for this video")
 
-    # Convert detection objects into dictionaries expected by the async service method.
-    detection_dicts = []
-    for detection in detections:
-        detection_dicts.append({
-            "word": detection.words,
-            "start_time": detection.srt_start_time,
-            "stop_time": detection.srt_stop_time,
-            # Optionally, include additional fields such as context if needed.
-        })
-
-    # Call the asynchronous method to extract audio segments concurrently.
-    audio_results = await DetectorService.extract_audio_segments(video.movie_path, detection_dicts, video.movie_name)
-
-    # audio_results is a list of dictionaries that include an "audio_path" key along with the original detection data.
-    processed_words = []
-    for result in audio_results:
-        # Create a new database record for each processed audio segment.
-        db_detection = models.MovieDetectorWords(
-            movie_name=video.movie_name,
-            words=result["word"],
-            movie_start_time=result["start_time"],
-            movie_stop_time=result["stop_time"],
-            sound_file_path=result["audio_path"])
-        db.add(db_detection)
-        processed_words.append(db_detection)
-
-        # Optionally, add a background task to further process the audio (e.g., speech-to-text)
-        background_tasks.add_task(speech_service.process_audio,
-                                  movie_name=video.movie_name,
-                                  audio_file_path=result["audio_path"],
-                                  words_list=[result["word"]],
-                                  db=db)
-
-    # Commit all changes to the database.
+    # Mark the video as being processed and return right away, the job id is the video id
+    video.movie_check_status = "audio_processing"
     db.commit()
-    return processed_words  # Return the list of processed audio segments
+    background_tasks.add_task(extract_audio_job, video.id, request.app.state.ffmpeg_semaphore)
+
+    return {"video_id": video.id, "status": video.movie_check_status}
+
+
+# Endpoint to poll the status of the audio processing job of a video
+@router.get("/process-audio/status/{video_id}", response_model=videos.AudioJob)
+async def get_audio_status(video_id: int, db: Session = Depends(get_db)):
+    video = db.query(models.VideoInfo.movie_check_status).filter(
+        models.VideoInfo.id == video_id).first()
+
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    return {"video_id": video_id, "status": video.movie_check_status}
 
 
 # Endpoint to fetch detections for a specific video
 @router.get("/detections/{video_name}", response_model=List[videos.DetectedWord])
 async def get_detections(video_name: str, db: Session = Depends(get_db)):
-    detections = db.query(models.MovieDetectorWords).filter(
+    # Select only the columns needed for the response instead of full ORM objects
+    detections = db.query(
+        models.WordsList.words_detector,
+        models.MovieDetectorWords.movie_start_time,
+        models.MovieDetectorWords.movie_stop_time,
+        models.MovieDetectorWords.sound_file_path).join(
+        models.WordsList, models.MovieDetectorWords.word_id == models.WordsList.id).filter(
         models.MovieDetectorWords.movie_name == video_name).all()
 
     if not detections:
         raise HTTPException(status_code=404, detail="No detections found for this video")
 
-    return detections
+    # Return the rows in the shape of the DetectedWord schema
+    return [{
+        "movie_name": video_name,
+        "words": words,
+        "start_time": start_time,
+        "stop_time": stop_time,
+        "sound_file_path": sound_file_path,
+    } for words, start_time, stop_time, sound_file_path in detections]
 
 
 # Endpoint to fetch speech-to-text results for a specific video
 @router.get("/speech-results/{video_name}", response_model=List[videos.DetectedWord])
 async def get_speech_results(video_name: str, db: Session = Depends(get_db)):
-    results = db.query(models.MovieSpeechResponse).filter(
+    # Select only the columns needed for the response instead of full ORM objects
+    results = db.query(
+        models.WordsList.words_detector,
+        models.MovieSpeechResponse.movie_start_time,
+        models.MovieSpeechResponse.movie_stop_time).join(
+        models.WordsList, models.MovieSpeechResponse.word_id == models.WordsList.id).filter(
         models.MovieSpeechResponse.movie_name == video_name).all()
 
     if not results:
         raise HTTPException(status_code=404, detail="No speech results found for this video")
 
-    return results
+    # Return the rows in the shape of the DetectedWord schema
+    return [{
+        "movie_name": video_name,
+        "words": words,
+        "start_time": start_time,
+        "stop_time": stop_time,
+    } for words, start_time, stop_time in results]
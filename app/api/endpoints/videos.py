@@ -18,7 +18,7 @@
 from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-import shutil
+import aiofiles
 import os
 from app.models.database import get_db
 from app.models import models
@@ -29,12 +29,27 @@ from app.core.config import get_settings
 router = APIRouter()
 settings = get_settings()
 
+# Allowed extensions as a set, built once when the module is loaded
+ALLOWED_EXTENSIONS = frozenset(settings.allowed_extensions_list)
+
 def allowed_file(filename: str) -> bool:
     """
     - Ensures the uploaded file has an extension that matches the allowed list in settings.
     - Returns True if valid, otherwise False.
     """
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in settings.ALLOWED_EXTENSIONS
+    return os.path.splitext(filename)[1].lstrip('.').lower() in ALLOWED_EXTENSIONS
+
+# Size of the chunks read from an upload and written to disk (4 MiB)
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+async def save_upload_file(upload: UploadFile, path: str) -> None:
+    """
+    - Copies the uploaded file to the given path in large chunks to keep the number of read/write calls low.
+    - Reading (UploadFile.read) and writing (aiofiles) both run outside the event loop.
+    """
+    async with aiofiles.open(path, "wb") as buffer:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            await buffer.write(chunk)
 
 @router.post("/upload", response_model=videos.Video)
 async def upload_video(
@@ -57,13 +72,11 @@ async def upload_video(
     
     # Save the uploaded video file to the designated directory
     video_path = os.path.join(settings.VIDEO_UPLOAD_DIR, video.filename)
-    with open(video_path, "wb") as buffer:
-        shutil.copyfileobj(video.file, buffer)
+    await save_upload_file(video, video_path)
     
     # Save the uploaded SRT file to the designated directory
     srt_path = os.path.join(settings.SRT_UPLOAD_DIR, srt.filename)
-    with open(srt_path, "wb") as buffer:
-        shutil.copyfileobj(srt.file, buffer)
+    await save_upload_file(srt, srt_path)
     
     # Create a new record in the database for the uploaded video
     db_video = models.VideoInfo(
@@ -74,7 +87,6 @@ async def upload_video(
     )
     db.add(db_video)
     db.commit()
-    db.refresh(db_video)
     return db_video
 
 @router.get("/", response_model=List[videos.Video])
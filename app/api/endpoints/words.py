@@ -15,12 +15,13 @@
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
 # Import necessary modules and dependencies
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
 from app.models.database import get_db
 from app.models import models
 from app.schemas import words
+from app.services.wordlist import invalidate_words_cache, build_profanity_matcher
 
 # Create a router instance for defining endpoints
 router = APIRouter()
@@ -32,7 +33,7 @@ router = APIRouter()
 """
 # 
 @router.post("/", response_model=words.Word)
-def create_word(word: words.WordCreate, db: Session = Depends(get_db)):
+def create_word(word: words.WordCreate, request: Request, db: Session = Depends(get_db)):
     # Check if the word already exists in the database
     db_word = db.query(models.WordsList).filter(
         models.WordsList.words_detector == word.words_detector
@@ -43,7 +44,9 @@ def create_word(word: words.WordCreate, db: Session = Depends(get_db)):
     db_word = models.WordsList(words_detector=word.words_detector)
     db.add(db_word)
     db.commit()
-    db.refresh(db_word)
+    # Reload the words list and swap in a rebuilt detection matcher that includes the new word
+    invalidate_words_cache()
+    request.app.state.profanity_matcher = build_profanity_matcher(db)
     return db_word
 
 # Define a GET endpoint to retrieve a list of words
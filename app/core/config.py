@@ -15,6 +15,7 @@
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
 # Import necessary modules and dependencies
+from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 from typing import List
@@ -36,6 +37,9 @@ class Settings(BaseSettings):
     # Database settings
     BASE_DIR: str = str(Path(__file__).resolve().parent.parent.parent)  # Base directory of the project
     DATABASE_URL: str  # Database connection URL
+    DB_POOL_SIZE: int = 20  # Connections kept open in the pool
+    DB_MAX_OVERFLOW: int = 40  # Extra connections allowed above the pool size under load
+    DB_POOL_RECYCLE: int = 1800  # Seconds after which a pooled connection is replaced
 
     # Directories for file uploads and output
     VIDEO_UPLOAD_DIR: str  # Directory for video uploads
@@ -49,6 +53,11 @@ class Settings(BaseSettings):
     # API settings
     API_V1_PREFIX: str  # API version prefix
 
+    # Processing settings
+    SCAN_WORKERS: int = 4  # Number of worker threads used to parse and scan SRT files
+    SCAN_PROCESSES: int = os.cpu_count() or 1  # Number of worker processes used to scan large SRT files (0 or 1 disables the pool)
+    FFMPEG_WORKERS: int = os.cpu_count() or 1  # Maximum number of FFmpeg processes running at the same time
+
     # Method to get the video upload directory path
     def get_video_upload_path(self) -> str:
         # Combine base directory with the video upload directory
@@ -69,11 +78,17 @@ class Settings(BaseSettings):
         os.makedirs(path, exist_ok=True)
         return path
 
-    # Property to validate and parse allowed extensions
+    # Parse allowed extensions once when the settings are loaded (JSON string or list, normalized to lowercase without dots)
+    @field_validator("ALLOWED_EXTENSIONS", mode="before")
+    @classmethod
+    def parse_allowed_extensions(cls, value):
+        if isinstance(value, str):
+            value = json.loads(value)
+        return [extension.lstrip(".").lower() for extension in value]
+
+    # Property kept for callers that read the parsed allowed extensions
     @property
     def allowed_extensions_list(self) -> List[str]:
-        if isinstance(self.ALLOWED_EXTENSIONS, str):
-            return json.loads(self.ALLOWED_EXTENSIONS)
         return self.ALLOWED_EXTENSIONS
 
     # Configuration for environment variables and settings behavior
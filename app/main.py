@@ -15,19 +15,53 @@
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
 # Import necessary modules and dependencies
+import asyncio
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import words, videos, detection
-from app.models.database import engine, init_db
+from app.models.database import engine, init_db, SessionLocal
 from app.models import models
 from app.core.config import settings
+from app.services.wordlist import build_profanity_matcher
 # Initialize the database and create tables if they don't exist
 init_db()
 
+# Manage resources shared by all requests for the lifetime of the application
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bounded thread pool for the blocking SRT parsing and scanning work
+    app.state.scan_executor = ThreadPoolExecutor(max_workers=settings.SCAN_WORKERS)
+    # Process pool that scans large SRT files on all CPU cores. The workers are started with "spawn": forking the
+    # running server (event loop, executor threads, database pool locks) can deadlock the child
+    app.state.scan_pool = ProcessPoolExecutor(
+        max_workers=settings.SCAN_PROCESSES,
+        mp_context=multiprocessing.get_context("spawn")) if settings.SCAN_PROCESSES > 1 else None
+    # Limits the FFmpeg processes of all audio jobs, created here so it belongs to the application's event loop
+    app.state.ffmpeg_semaphore = asyncio.Semaphore(settings.FFMPEG_WORKERS)
+    # Build the detection matcher once from the words list, create_word replaces it when words change
+    db = SessionLocal()
+    try:
+        app.state.profanity_matcher = build_profanity_matcher(db)
+        # Audio jobs run inside the application process, a job still marked as running was interrupted
+        # by a restart, mark it as failed so it can be started again
+        db.query(models.VideoInfo).filter(models.VideoInfo.movie_check_status == "audio_processing").update(
+            {"movie_check_status": "audio_failed"}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    yield
+    app.state.scan_executor.shutdown(wait=False)
+    if app.state.scan_pool is not None:
+        app.state.scan_pool.shutdown(wait=False)
+
 # Create FastAPI application instance with project settings
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan
 )
 
 # Configure Cross-Origin Resource Sharing (CORS) middleware
@@ -15,10 +15,11 @@
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
 # Import necessary modules and dependencies
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+import logging
 import os 
 
 # Ensure the directory for the SQLite database exists 
@@ -26,27 +27,138 @@ import os
  -This replaces the 'sqlite:///' prefix in the DATABASE_URL with an empty string to get the directory path
  -Create the database engine using the connection URL from settings
  -The connect_args parameter is used to configure SQLite-specific options
+ -pool_size/max_overflow: Connections kept open and extra connections allowed under load (DB_POOL_SIZE/DB_MAX_OVERFLOW)
+ -pool_pre_ping: Check a pooled connection before use so stale connections are replaced
+ -pool_recycle: Replace connections older than DB_POOL_RECYCLE seconds
 """
 os.makedirs(os.path.dirname(settings.DATABASE_URL.replace('sqlite:///', '')), exist_ok=True)
 engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
+    settings.DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE
 )
 
+"""
+ -Switch SQLite to write-ahead logging on every new connection, readers no longer block the writer
+ -synchronous=NORMAL: fsync at checkpoints instead of every commit (safe with WAL)
+ -cache_size=-65536: Keep up to 64 MiB of pages in memory per connection
+ -temp_store=MEMORY: Temporary tables and indexes (sorting, grouping) stay in memory
+ -mmap_size=268435456: Read up to 256 MiB of the database file through memory mapping
+"""
+if settings.DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
 """
  -Create a session maker factory
  -autocommit=False: Changes are committed manually
  -autoflush=False: Changes are not automatically flushed to the database
  -bind=engine: Bind the session to the database engine
+ -expire_on_commit=False: Objects keep their loaded values after commit, so returning them does not re-query each row
 
 """
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
 
 # Declare the base class for ORM models
 Base = declarative_base()
 
+# Logger for the database start-up steps
+logger = logging.getLogger(__name__)
+
+# Tables that used to store the movie name and the word as strings only
+DETECTION_TABLES = ("srt_detector_words", "movie_detector_words", "movie_speech_resposn")
+
+# Bring a database created by an older version of the application up to the current models
+"""
+ -SQLite can not change existing tables through create_all, so the columns added later are added with ALTER TABLE
+ -video_id is filled from the video with the same movie name (the lowest id when several videos share a name)
+ -The old words strings are added to the words list when missing, then word_id is filled from it
+ -Duplicate words are merged into the lowest id before the unique index on the words list is created
+ -The old movie_name and words columns are kept, they are nullable and no longer written
+"""
+def upgrade_schema(connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+
+    for table in DETECTION_TABLES:
+        if table not in tables:
+            continue
+        columns = {column["name"] for column in inspector.get_columns(table)}
+
+        if "video_id" not in columns:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN video_id INTEGER REFERENCES movie_video_info (id)"))
+            connection.execute(text(
+                f"UPDATE {table} SET video_id = (SELECT MIN(v.id) FROM movie_video_info v "
+                f"WHERE v.movie_name = {table}.movie_name) WHERE video_id IS NULL"))
+
+        if "word_id" not in columns:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN word_id INTEGER REFERENCES movie_words_lists (id)"))
+            if "words" in columns:
+                connection.execute(text(
+                    f"INSERT INTO movie_words_lists (words_detector) SELECT DISTINCT words FROM {table} "
+                    f"WHERE words IS NOT NULL AND words NOT IN "
+                    f"(SELECT words_detector FROM movie_words_lists WHERE words_detector IS NOT NULL)"))
+                connection.execute(text(
+                    f"UPDATE {table} SET word_id = (SELECT MIN(w.id) FROM movie_words_lists w "
+                    f"WHERE w.words_detector = {table}.words) WHERE word_id IS NULL"))
+
+    # Older databases have no unique constraint on the words list
+    if "movie_words_lists" in tables:
+        unique_columns = [constraint["column_names"] for constraint in inspector.get_unique_constraints("movie_words_lists")]
+        unique_columns += [index["column_names"] for index in inspector.get_indexes("movie_words_lists") if index["unique"]]
+        if ["words_detector"] not in unique_columns:
+            # Point every detection at the lowest id of its word, then drop the other copies
+            for table in DETECTION_TABLES:
+                if table in tables:
+                    connection.execute(text(
+                        f"UPDATE {table} SET word_id = (SELECT MIN(w2.id) FROM movie_words_lists w1 "
+                        f"JOIN movie_words_lists w2 ON w2.words_detector = w1.words_detector "
+                        f"WHERE w1.id = {table}.word_id) WHERE word_id IS NOT NULL"))
+            connection.execute(text(
+                "DELETE FROM movie_words_lists WHERE id NOT IN "
+                "(SELECT MIN(id) FROM movie_words_lists GROUP BY words_detector)"))
+            connection.execute(text(
+                "CREATE UNIQUE INDEX uq_movie_words_lists_words_detector ON movie_words_lists (words_detector)"))
+
+# Stop the application at start-up when the database does not have every column the models use
+def check_schema(connection):
+    inspector = inspect(connection)
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        missing += [f"{table.name}.{column.name}" for column in table.columns if column.name not in columns]
+    if missing:
+        raise RuntimeError(f"The database schema is out of date, missing columns: {', '.join(missing)}")
+
 # Initialize the database by creating all tables defined in the ORM models
+"""
+ -create_all skips tables that already exist, so the columns added later are added by upgrade_schema
+ -check_schema fails loudly if a column is still missing
+ -checkfirst=True: Indexes that already exist are left alone, the ones added to the models later are created
+ -An index that can not be created is logged and stops the start-up instead of being skipped
+"""
 def init_db():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+        check_schema(connection)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                index.create(bind=engine, checkfirst=True)
+            except Exception:
+                logger.error(f"Could not create index {index.name} on table {table.name}")
+                raise
 
 # Define a dependency for creating and managing database sessions
 def get_db():
@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Index, ForeignKey
 from .database import Base
 
 # Define the WordsList table
@@ -22,14 +22,18 @@ class WordsList(Base):
     __tablename__ = "movie_words_lists"  # Table name in the database
     
     id = Column(Integer, primary_key=True, index=True)
-    words_detector = Column(String(200))
+    words_detector = Column(String(200), unique=True)  # Each word is stored once and referenced by id
 
 # Define the VideoInfo table
 class VideoInfo(Base):
     __tablename__ = "movie_video_info"  # Table name in the database
+    # The detection endpoints look videos up by id together with their check status
+    __table_args__ = (
+        Index("ix_movie_video_info_status_id", "movie_check_status", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    movie_name = Column(String(200))
+    movie_name = Column(String(200), index=True)
     movie_path = Column(String(200))
     movie_srt_path = Column(String(200))
     movie_check_status = Column(String(200))
@@ -39,8 +43,9 @@ class SrtDetectorWords(Base):
     __tablename__ = "srt_detector_words"  # Table name in the database
     
     id = Column(Integer, primary_key=True, index=True)
-    movie_name = Column(String(200))
-    words = Column(String(200))
+    video_id = Column(Integer, ForeignKey("movie_video_info.id"), index=True)  # Video the detection belongs to
+    movie_name = Column(String(200), index=True)  # Detections are queried by movie name
+    word_id = Column(Integer, ForeignKey("movie_words_lists.id"), index=True)  # Detected word from the words list
     srt_start_time = Column(String(200))
     srt_stop_time = Column(String(200))
 
@@ -49,8 +54,9 @@ class MovieDetectorWords(Base):
     __tablename__ = "movie_detector_words"  # Table name in the database
     
     id = Column(Integer, primary_key=True, index=True)
-    movie_name = Column(String(200))
-    words = Column(String(200))
+    video_id = Column(Integer, ForeignKey("movie_video_info.id"), index=True)  # Video the detection belongs to
+    movie_name = Column(String(200), index=True)  # Detections are queried by movie name
+    word_id = Column(Integer, ForeignKey("movie_words_lists.id"), index=True)  # Detected word from the words list
     movie_start_time = Column(String(200))
     movie_stop_time = Column(String(200))
     sound_file_path = Column(String(200))
@@ -60,7 +66,8 @@ class MovieSpeechResponse(Base):
     __tablename__ = "movie_speech_resposn"  # Table name in the database
     
     id = Column(Integer, primary_key=True, index=True)
-    movie_name = Column(String(200))
-    words = Column(String(200))
+    video_id = Column(Integer, ForeignKey("movie_video_info.id"), index=True)  # Video the detection belongs to
+    movie_name = Column(String(200), index=True)  # Detections are queried by movie name
+    word_id = Column(Integer, ForeignKey("movie_words_lists.id"), index=True)  # Detected word from the words list
     movie_start_time = Column(String(200))
     movie_stop_time = Column(String(200))
@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 
 # Base schema for video information
@@ -33,8 +33,7 @@ class Video(VideoBase):
     movie_path: str
     movie_srt_path: str
 
-    class Config:
-        from_attributes = True  # Allow population of fields from ORM attributes
+    model_config = ConfigDict(from_attributes=True)  # Allow population of fields from ORM attributes
 
 # Schema for detected words in a movie or subtitle
 class DetectedWord(BaseModel):
@@ -44,5 +43,9 @@ class DetectedWord(BaseModel):
     stop_time: str
     sound_file_path: Optional[str] = None
 
-    class Config:
-        from_attributes = True  # Allow population of fields from ORM attributes
+    model_config = ConfigDict(from_attributes=True)  # Allow population of fields from ORM attributes
+
+# Schema for the status of the audio processing job of a video (the job id is the video id)
+class AudioJob(BaseModel):
+    video_id: int
+    status: str
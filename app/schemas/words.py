@@ -14,7 +14,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 # Base schema for words, used as a foundation for other schemas
 class WordBase(BaseModel):
@@ -28,5 +28,4 @@ class WordCreate(WordBase):
 class Word(WordBase):
     id: int
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
@@ -15,96 +15,361 @@
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
 # Import necessary modules and dependencies
-import pysrt
-from typing import List, Dict, Any
-import random
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
+from concurrent.futures import Executor
+from bisect import bisect_right
+from functools import lru_cache
+import logging
+import re
 import os
+import uuid
 import asyncio
 from app.core.config import get_settings
 
-# Initialize settings for the application
+# pyahocorasick is preferred, fall back to a compiled regex when it is not installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Initialize settings and logger for the application
 settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Smallest number of SRT cues worth splitting across the scan process pool
+PARALLEL_SCAN_MIN_CUES = 2000
+
+# Largest number of audio segments written by one FFmpeg process, every output opens a file and an encoder
+MAX_OUTPUTS_PER_FFMPEG = 64
+
+# One SRT cue: the "HH:MM:SS,mmm --> HH:MM:SS,mmm" timing line (the cue number before it and anything
+# after the stop time, like positions, are skipped) followed by the text lines up to the next blank line
+SRT_CUE_RE = re.compile(
+    r"^[ \t]*(\d+:\d\d:\d\d[,.]\d+)[ \t]*-->[ \t]*(\d+:\d\d:\d\d[,.]\d+)[^\n]*"
+    r"(?:\n(?![ \t]*\n)(.*?))?(?=\n[ \t]*\n|\n?\Z)",
+    re.M | re.S)
+
+
+class WordMatcher:
+    """
+    Matches the whole words list in one pass, using an Aho-Corasick automaton
+    or a compiled regex when pyahocorasick is not installed.
+
+    Calling the matcher with lowercased text yields (end index, original word) for every match.
+    Pickling it (to send it to a scan worker process) only sends the words, the worker
+    gets the matcher from its own get_cached_matcher cache.
+    """
+
+    def __init__(self, words_list: Iterable[str]):
+        self.words = tuple(words_list)
+
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for word in self.words:
+                # Store the lowercased word as the key and keep the original word as the value
+                automaton.add_word(word.lower(), word)
+            automaton.make_automaton()
+            self.match = automaton.iter
+            return
+
+        # Map each lowercased word back to its original form
+        original_words = {word.lower(): word for word in self.words}
+        # Every listed word that is a prefix of a word, shortest first (e.g. "ass" for "assassin")
+        prefix_words = {
+            word: [word[:length] for length in range(1, len(word)) if word[:length] in original_words]
+            for word in original_words
+        }
+        # One alternation for all words inside a lookahead, so the regex is tried at every position and
+        # matches can overlap. Longest first, so the longest word that starts at a position is found,
+        # the shorter words starting there are its prefixes. Like the automaton, every contained word
+        # is reported (e.g. "damn" and "damned" in "damned").
+        pattern = re.compile("(?=(" + "|".join(
+            re.escape(word) for word in sorted(original_words, key=len, reverse=True)) + "))")
+
+        def match_words(text: str) -> Iterable[Tuple[int, str]]:
+            for match in pattern.finditer(text):
+                start = match.start()
+                longest = match.group(1)
+                for word in prefix_words[longest]:
+                    yield start + len(word) - 1, original_words[word]
+                yield start + len(longest) - 1, original_words[longest]
+
+        self.match = match_words
+
+    def __call__(self, text: str) -> Iterable[Tuple[int, str]]:
+        return self.match(text)
+
+    def __reduce__(self):
+        return (get_cached_matcher, (self.words,))
+
+
+# Matchers keyed by the sorted words list, so a words list is compiled once per process
+# (the API process and every scan worker) no matter how often it is requested
+@lru_cache(maxsize=8)
+def get_cached_matcher(words: Tuple[str, ...]) -> WordMatcher:
+    return WordMatcher(words)
 
 # Service class for handling detection and audio extraction operations
 """
+ -(build_matcher) Build a matcher (Aho-Corasick automaton or compiled regex) from the profanity words list .
+ -(iter_srt) Parse the cues of an SRT file into (start_time, stop_time, text) with one regex pass .
+ -(read_srt) Read all the cues of an SRT file into a list .
+ -(match_cues) Find the profanity words of every cue in a single matcher pass .
+ -(check_srt_async) Use (check_srt) as asynchronous method, large files are scanned by a process pool .
  -(check_srt) Check SRT file for profanity words .
- -(check_srt_async) Use (check_srt) as asynchronous method .
- -(extract_audio_segments) Extract audio segments from video based on detected words .
- -(extract_audio_segments_async) Use (extract_audio_segments) as asynchronous method .
+ -(build_detections) Turn the matched words into detections, merging overlapping cues .
+ -(time_to_seconds) Convert an SRT timestamp (HH:MM:SS.mmm) into seconds .
+ -(build_extract_command) Build one FFmpeg command that writes several audio segments .
+ -(run_ffmpeg) Run an FFmpeg command as an asynchronous subprocess, bounded by a semaphore .
+ -(extract_audio_segments) Extract the audio segments of a video with a few concurrent FFmpeg invocations, raises if any of them fails .
+ -(remove_files) Delete audio segment files, ignoring the ones that do not exist .
 """
 class DetectorService:
+
     @staticmethod
-    async def check_srt_async(srt_path: str, words_list: List[str]) -> List[Dict[str, Any]]:
-        return await asyncio.to_thread(DetectorService.check_srt, srt_path, words_list)
+    def build_matcher(words_list: Iterable[str]) -> WordMatcher:
+        # Sorting makes the cache key independent of the order the words come from the database
+        return get_cached_matcher(tuple(sorted(words_list)))
+
+    @staticmethod
+    def iter_srt(srt_path: str) -> Iterator[Tuple[str, str, str]]:
+        # Read the whole file and let the compiled regex find the cues in one pass
+        with open(srt_path, encoding="utf-8-sig", errors="replace") as srt_file:
+            content = srt_file.read().replace("\r\n", "\n")
+
+        for cue in SRT_CUE_RE.finditer(content):
+            start_time, stop_time, text = cue.groups()
+            # Replace the (",") with (".") because ffmpeg does not support (,)
+            yield start_time.replace(",", "."), stop_time.replace(",", "."), text or ""
+
+    @staticmethod
+    def read_srt(srt_path: str) -> List[Tuple[str, str, str]]:
+        return list(DetectorService.iter_srt(srt_path))
+
+    @staticmethod
+    def match_cues(texts: List[str], matcher: WordMatcher) -> Dict[int, Dict[str, None]]:
+        # Join the lowercased cue texts with a separator that no word contains, so the matcher
+        # scans all of them in one native pass and a match can not span two cues
+        texts = [text.lower() for text in texts]
+        cue_ends = []
+        position = -1
+        for text in texts:
+            # Position of the separator that follows this cue
+            position += len(text) + 1
+            cue_ends.append(position)
+        buffer = "\0".join(texts)
+
+        # Case-insensitive match of all words, every word is reported once per cue
+        # even if it appears several times (set of words per cue, kept in order)
+        matched_words = {}
+        for end_index, word in matcher(buffer):
+            # Find the cue the match ends in from its position in the buffer
+            cue_index = bisect_right(cue_ends, end_index)
+            matched_words.setdefault(cue_index, {})[word] = None
+
+        return matched_words
+
+    @staticmethod
+    async def check_srt_async(
+        srt_path: str,
+        matcher: WordMatcher,
+        executor: Optional[Executor] = None,
+        scan_pool: Optional[Executor] = None
+    ) -> List[Dict[str, Any]]:
+        # Parse and scan the SRT file on the given executor (default executor if None) so the event loop stays free.
+        # A pool with a single worker only adds the pickling of the cues, so it is used with 2 workers or more
+        loop = asyncio.get_running_loop()
+        scan_processes = getattr(scan_pool, "_max_workers", 0) if scan_pool is not None else 0
+        if scan_processes < 2:
+            return await loop.run_in_executor(executor, DetectorService.check_srt, srt_path, matcher)
+
+        cues = await loop.run_in_executor(executor, DetectorService.read_srt, srt_path)
+        texts = [text for _, _, text in cues]
+        if len(texts) < PARALLEL_SCAN_MIN_CUES:
+            matched_words = await loop.run_in_executor(executor, DetectorService.match_cues, texts, matcher)
+            return DetectorService.build_detections(cues, matched_words)
+
+        # Split the cues into one chunk per worker process and scan the chunks in parallel
+        chunk_size = -(-len(texts) // scan_processes)
+        chunk_starts = range(0, len(texts), chunk_size)
+        results = await asyncio.gather(*[
+            loop.run_in_executor(scan_pool, DetectorService.match_cues, texts[first:first + chunk_size], matcher)
+            for first in chunk_starts
+        ])
+
+        # Shift the cue indexes of every chunk back to positions in the whole file
+        matched_words = {}
+        for first, chunk_matches in zip(chunk_starts, results):
+            for cue_index, words in chunk_matches.items():
+                matched_words[first + cue_index] = words
+
+        return DetectorService.build_detections(cues, matched_words)
                 
     @staticmethod
-    def check_srt(srt_path: str, words_list: List[str]) -> List[Dict[str, Any]]:
+    def check_srt(srt_path: str, matcher: WordMatcher) -> List[Dict[str, Any]]:
+        cues = DetectorService.read_srt(srt_path)
+        matched_words = DetectorService.match_cues([text for _, _, text in cues], matcher)
+        return DetectorService.build_detections(cues, matched_words)
+
+    @staticmethod
+    def build_detections(cues: List[Tuple[str, str, str]], matched_words: Dict[int, Dict[str, None]]) -> List[Dict[str, Any]]:
         detected_words = []
-        srt_file = pysrt.open(srt_path)
-        # Iterate through each line in the SRT file
-        for line in srt_file:
-            for word in words_list:
-                # Case-insensitive match
-                if word.lower() in line.text.lower(): 
-                    detected_words.append({
-                        "word": word,
-                        # Replace the (",") with (".") because ffmpeg does not support (,)
-                        "start_time": str(line.start).replace(",", "."),
-                        "stop_time": str(line.end).replace(",", "."),
-                        "context": line.text
-                    })
+        # Last detection of every word with its stop time in seconds, used to merge overlapping cues
+        last_detections = {}
+        for cue_index in matched_words:
+            start_time, stop_time, text = cues[cue_index]
+            start_seconds = DetectorService.time_to_seconds(start_time)
+            stop_seconds = DetectorService.time_to_seconds(stop_time)
+            for word in matched_words[cue_index]:
+                previous = last_detections.get(word)
+                if previous is not None and start_seconds <= previous[1]:
+                    # The cue overlaps the previous detection of the same word, extend it instead of adding a row
+                    detection = previous[0]
+                    if stop_seconds > previous[1]:
+                        detection["stop_time"] = stop_time
+                        last_detections[word] = (detection, stop_seconds)
+                    detection["context"] += "\n" + text
+                    continue
+
+                detection = {
+                    "word": word,
+                    "start_time": start_time,
+                    "stop_time": stop_time,
+                    "context": text
+                }
+                detected_words.append(detection)
+                last_detections[word] = (detection, stop_seconds)
         
         return detected_words
         
     @staticmethod
-    async def extract_audio_segment_async(video_path: str, detection: Dict[str, Any], movie_name: str) -> str:
-        # Generate a unique file name as before
-        create_number = random.randint(1, 1001)
-        output_file = os.path.join(settings.SOUND_OUTPUT_DIR, f"{movie_name}-{create_number}.wav")
-
-        # Prepare the FFmpeg command
-        command = [
-            "ffmpeg",
-            "-ss", detection["start_time"],
-            "-i", video_path,
-            "-t", detection["stop_time"],
-            "-acodec", "libmp3lame",
-            "-b:a", "320k",
-            output_file,
-            "-y"  # Overwrite output file if it exists
-        ]
+    def time_to_seconds(time_str: str) -> float:
+        # Split "HH:MM:SS.mmm" into its parts and sum them up as seconds
+        hours, minutes, seconds = time_str.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
 
-        # Launch the FFmpeg process asynchronously
-        process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE )
+    @staticmethod
+    def build_extract_command(video_path: str, spans: List[Tuple[float, float]], output_files: List[str]) -> List[str]:
+        # Seek the input to the first segment so the audio before it is not decoded
+        offset = min(start for start, _ in spans)
+
+        # Prepare one FFmpeg command that opens the video once and writes one output per segment
+        # (-nostdin: never read the terminal, -loglevel error: only errors are written to stderr)
+        command = ["ffmpeg", "-nostdin", "-loglevel", "error", "-y", "-ss", f"{offset:.3f}", "-i", video_path]
+        for (start, stop), output_file in zip(spans, output_files):
+            command += [
+                # Output timestamps are relative to the seeked input
+                "-ss", f"{start - offset:.3f}",
+                "-to", f"{stop - offset:.3f}",
+                "-acodec", "libmp3lame",
+                "-b:a", "320k",
+                output_file
+            ]
+        return command
 
-        stdout, stderr = await process.communicate()
+    @staticmethod
+    async def run_ffmpeg(command: List[str], semaphore: asyncio.Semaphore) -> None:
+        # The semaphore limits the FFmpeg processes running at the same time
+        async with semaphore:
+            # Launch the FFmpeg process asynchronously
+            # Only stderr is read (for the error message), stdin and stdout are not used
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE)
+
+            _, stderr = await process.communicate()
 
         if process.returncode != 0:
             error_message = stderr.decode().strip()
             raise Exception(f"FFmpeg error: {error_message}")
 
-        return output_file
-
     @staticmethod
-    async def extract_audio_segments(video_path: str, detections: List[Dict[str, Any]], movie_name: str) -> List[Dict[str, Any]]:
-        # Create a list of tasks using the asynchronous extraction method
-        tasks = [
-            DetectorService.extract_audio_segment_async(video_path, detection, movie_name)
-            for detection in detections
+    async def extract_audio_segments(
+        video_path: str,
+        detections: List[Dict[str, Any]],
+        movie_name: str,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ) -> List[Dict[str, Any]]:
+        # Parse the timestamps into seconds once so ffmpeg gets plain numbers
+        spans = []
+        valid_detections = []
+        for detection in detections:
+            start = DetectorService.time_to_seconds(detection["start_time"])
+            stop = DetectorService.time_to_seconds(detection["stop_time"])
+            # A zero-length or inverted cue makes ffmpeg abort the whole process ("-to value smaller than -ss"),
+            # skip it so it does not fail the other segments of its batch
+            if stop <= start:
+                logger.warning(
+                    f"Skipping empty audio segment {detection['start_time']} --> {detection['stop_time']} for {movie_name}")
+                continue
+            spans.append((start, stop))
+            valid_detections.append(detection)
+        detections = valid_detections
+
+        if not detections:
+            return []
+
+        # A random UUID keeps the file names unique, also across repeated runs for the same video
+        output_files = [
+            os.path.join(settings.SOUND_OUTPUT_DIR, f"{movie_name}-{uuid.uuid4().hex}.wav")
+            for _ in detections
+        ]
+
+        # Order the detections by start time, so every batch covers one compact stretch of the video:
+        # each process seeks to its first segment and decodes only up to its last one
+        order = sorted(range(len(detections)), key=lambda index: spans[index][0])
+
+        # Split the ordered detections into contiguous batches, one FFmpeg process per batch, so the
+        # batches are decoded in parallel while each process still writes many segments.
+        # Long movies get more batches than workers (at most MAX_OUTPUTS_PER_FFMPEG outputs each)
+        batch_size = min(-(-len(detections) // settings.FFMPEG_WORKERS), MAX_OUTPUTS_PER_FFMPEG)
+        batches = [
+            order[first:first + batch_size]
+            for first in range(0, len(detections), batch_size)
         ]
 
-        # Run all tasks concurrently
+        # Run all batches concurrently, the semaphore (shared by all jobs of the application, or one
+        # for this call if None) bounds the number of processes
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.FFMPEG_WORKERS)
+        tasks = [
+            DetectorService.run_ffmpeg(DetectorService.build_extract_command(
+                video_path,
+                [spans[index] for index in batch],
+                [output_files[index] for index in batch]), semaphore)
+            for batch in batches
+        ]
         results = await asyncio.gather(*tasks, return_exceptions=True)
 
+        # A failed batch fails the whole extraction, so the caller never stores a partial result
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            for error in errors:
+                logger.error(f"Error extracting audio segments for {movie_name}: {error}")
+            # Remove the files the other batches already wrote, nothing will reference them
+            DetectorService.remove_files(output_files)
+            raise Exception(f"{len(errors)} of {len(batches)} FFmpeg batches failed for {movie_name}: {errors[0]}")
+
+        # Map every output file back to its detection by position
         audio_segments = []
-        for detection, result in zip(detections, results):
-            if isinstance(result, Exception):
-                print(f"Error extracting audio segment for detection {detection}: {result}")
-            else:
+        for batch in batches:
+            for index in batch:
                 audio_segments.append({
-                    **detection,
-                    "audio_path": result
+                    **detections[index],
+                    "audio_path": output_files[index]
                 })
 
         return audio_segments
 
+    @staticmethod
+    def remove_files(paths: Iterable[str]) -> None:
+        # Delete the given files, missing ones (never written or already removed) are ignored
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as error:
+                logger.warning(f"Could not remove {path}: {error}")
@@ -15,10 +15,14 @@
 # along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
 
 # Import necessary modules and dependencies
+import asyncio
 import logging
 from typing import List, Dict, Any, Optional
+from sqlalchemy import insert, select, bindparam
 from sqlalchemy.orm import Session
 from app.models import models
+from app.models.database import SessionLocal
+from app.services.wordlist import get_known_word_ids
 from app.core.exceptions import DetectorException
 
 # Configure logging
@@ -28,6 +32,21 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Maximum number of audio files processed at the same time by batch_process_audio
+BATCH_CONCURRENCY = 8
+
+# Statement for the speech results of a movie, built once so SQLAlchemy reuses its compiled form.
+# Only the needed columns are selected, so rows come back as tuples instead of ORM objects.
+SPEECH_RESULTS_QUERY = select(
+    models.WordsList.words_detector,
+    models.MovieSpeechResponse.movie_start_time,
+    models.MovieSpeechResponse.movie_stop_time
+).join(
+    models.WordsList, models.MovieSpeechResponse.word_id == models.WordsList.id
+).where(
+    models.MovieSpeechResponse.movie_name == bindparam("movie_name")
+)
+
 class SpeechService:
     """
     Mock implementation of speech-to-text service for development.
@@ -45,7 +64,8 @@ class SpeechService:
         self,
         movie_name: str,
         words_list: List[str],
-        db: Session
+        db: Session,
+        video_id: Optional[int] = None
     ) -> None:
         """
         Create mock timestamps for detected words.
@@ -57,25 +77,38 @@ class SpeechService:
             movie_name: Name of the movie being processed.
             words_list: List of words to create mock detections for.
             db: Database session for storing results.
+            video_id: ID of the video the results belong to.
         """
         try:
+            # Words are stored by their id in the words list. Words that are not in it are logged and
+            # skipped, the speech service does not change the profanity words list.
+            word_ids = get_known_word_ids(db, words_list)
+            unknown_words = sorted(set(words_list) - set(word_ids))
+            if unknown_words:
+                logger.warning(f"Skipping words that are not in the words list for {movie_name}: {', '.join(unknown_words)}")
+
+            rows = []
             current_time = 0.0
             for word in words_list:
+                if word not in word_ids:
+                    continue
                 # Simulate 2-second intervals for each word detection.
                 start_time = current_time
                 end_time = current_time + 2.0
 
-                # Create a mock speech response entry for the database.
-                speech_response = models.MovieSpeechResponse(
-                    movie_name=movie_name,
-                    words=word,
-                    movie_start_time=str(start_time),
-                    movie_stop_time=str(end_time)
-                )
-                db.add(speech_response)
+                # Create a mock speech response row for the database.
+                rows.append({
+                    "video_id": video_id,
+                    "movie_name": movie_name,
+                    "word_id": word_ids[word],
+                    "movie_start_time": str(start_time),
+                    "movie_stop_time": str(end_time)
+                })
                 current_time += 3.0  # Add a 1-second gap between detections.
 
-            # Commit the simulated results to the database.
+            # Insert all rows with one Core executemany (no ORM objects) and commit the simulated results.
+            if rows:
+                db.execute(insert(models.MovieSpeechResponse), rows)
             db.commit()
             
         except Exception as e:
@@ -106,7 +139,8 @@ class SpeechService:
         self,
         movie_name: str,
         words_list: List[str],
-        db: Session
+        db: Session,
+        video_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Mock implementation of audio processing.
@@ -118,6 +152,7 @@ class SpeechService:
             movie_name: Name of the movie being processed.
             words_list: List of words to detect.
             db: Database session for storing results.
+            video_id: ID of the video the results belong to.
 
         Returns:
             A dictionary containing mock processing results and statistics.
@@ -127,7 +162,7 @@ class SpeechService:
         
         try:
             # Simulate the detection of words and save timestamps.
-            self._mock_process_timestamps(movie_name, words_list, db)
+            self._mock_process_timestamps(movie_name, words_list, db, video_id)
             
             # Generate mock processing statistics.
             stats = self._create_mock_stats(words_list)
@@ -167,9 +202,7 @@ class SpeechService:
         
         try:
             # Query the database for existing results.
-            results = db.query(models.MovieSpeechResponse).filter(
-                models.MovieSpeechResponse.movie_name == movie_name
-            ).all()
+            results = db.execute(SPEECH_RESULTS_QUERY, {"movie_name": movie_name}).all()
             
             if not results:
                 # Return mock data if no results are found.
@@ -183,11 +216,11 @@ class SpeechService:
             
             # Convert database results to dictionary format.
             return [{
-                "word": result.words,
-                "start_time": result.movie_start_time,
-                "stop_time": result.movie_stop_time,
+                "word": words,
+                "start_time": start_time,
+                "stop_time": stop_time,
                 "confidence": 0.95  # Mock confidence score.
-            } for result in results]
+            } for words, start_time, stop_time in results]
             
         except Exception as e:
             # Log and raise an error if retrieval fails.
@@ -200,42 +233,52 @@ class SpeechService:
         movie_name: str,
         audio_files: List[str],
         words_list: List[str],
-        db: Session
+        video_id: Optional[int] = None
     ) -> List[Dict[str, Any]]:
         """
         Mock implementation of batch audio processing.
 
         Simulates the processing of multiple audio files in a batch.
+        The files are processed concurrently (at most BATCH_CONCURRENCY at a time),
+        each one with its own database session.
 
         Args:
             movie_name: Name of the movie.
             audio_files: List of audio file paths (not used in mock mode).
             words_list: List of words to detect.
-            db: Database session for storing results.
+            video_id: ID of the video the results belong to.
 
         Returns:
-            A list of processing results for each audio file.
+            A list of processing results for each audio file, in the order of audio_files.
         """
         logger.info(f"Batch processing {len(audio_files)} audio files for {movie_name}")
-        
-        results = []
-        for audio_file in audio_files:
-            try:
-                # Simulate audio processing for each file.
-                result = await self.process_audio(
-                    movie_name=movie_name,
-                    words_list=words_list,
-                    db=db
-                )
-                results.append(result)
-                
-            except Exception as e:
-                # Log and add the error to the results if processing fails.
-                logger.error(f"Error processing {audio_file}: {str(e)}")
-                results.append({
-                    "success": False,
-                    "audio_file": audio_file,
-                    "error": str(e)
-                })
-        
-        return results
+
+        # Caps the number of files (and database sessions) processed at the same time.
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def process_file(audio_file: str) -> Dict[str, Any]:
+            async with semaphore:
+                # Sessions are not safe to share between concurrent tasks, so each file gets its own.
+                db = SessionLocal()
+                try:
+                    # Simulate audio processing for each file.
+                    return await self.process_audio(
+                        movie_name=movie_name,
+                        words_list=words_list,
+                        db=db,
+                        video_id=video_id
+                    )
+
+                except Exception as e:
+                    # Log and add the error to the results if processing fails.
+                    logger.error(f"Error processing {audio_file}: {str(e)}")
+                    return {
+                        "success": False,
+                        "audio_file": audio_file,
+                        "error": str(e)
+                    }
+
+                finally:
+                    db.close()
+
+        return await asyncio.gather(*(process_file(audio_file) for audio_file in audio_files))
@@ -0,0 +1,81 @@
+# Copyright (C) 2024 Mustafa Naseer
+#
+# This file is part of Movie Profanity Detector application.
+#
+# Movie Profanity Detector is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation version 3 of the License.
+#
+# Movie Profanity Detector is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
+
+# Import necessary modules and dependencies
+from typing import Optional, Tuple, Dict, Iterable
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models import models
+from app.services.detector import DetectorService, WordMatcher
+
+# In-process cache of the profanity words list as {word: id} (None means it has to be loaded again)
+_WORDS_CACHE: Optional[Dict[str, int]] = None
+
+
+def get_word_ids_cached(db: Session) -> Dict[str, int]:
+    """
+    - Returns the words list as a {word: id} dictionary, skipping empty entries.
+    - Queries the database only on the first call or after invalidate_words_cache().
+    """
+    global _WORDS_CACHE
+    if _WORDS_CACHE is None:
+        rows = db.query(models.WordsList.words_detector, models.WordsList.id).all()
+        _WORDS_CACHE = {word: word_id for word, word_id in rows if word}
+    return _WORDS_CACHE
+
+
+def get_words_cached(db: Session) -> Tuple[str, ...]:
+    """
+    - Returns the (cached) words list as a tuple of strings.
+    """
+    return tuple(get_word_ids_cached(db))
+
+
+def get_known_word_ids(db: Session, words: Iterable[str]) -> Dict[str, int]:
+    """
+    - Returns a {word: id} dictionary for the given words that are in the words list.
+    - Words missing from the (cached) list are looked up once in the database, in case another process added them.
+    - Never adds words, the profanity words list only changes through the words endpoints (create_word),
+      which also rebuilds the detection matcher. Unknown words are simply not in the result.
+    """
+    words = set(words)
+    word_ids = {word: word_id for word, word_id in get_word_ids_cached(db).items() if word in words}
+    missing = [word for word in words if word not in word_ids]
+    if missing:
+        word_ids.update(db.execute(
+            select(models.WordsList.words_detector, models.WordsList.id).where(
+                models.WordsList.words_detector.in_(missing))
+        ).all())
+    return word_ids
+
+
+def invalidate_words_cache() -> None:
+    """
+    - Drops the cached words list so the next call reloads it from the database.
+    """
+    global _WORDS_CACHE
+    _WORDS_CACHE = None
+
+
+def build_profanity_matcher(db: Session) -> Optional[WordMatcher]:
+    """
+    - Builds the detection matcher from the (cached) words list.
+    - Returns None when there are no words to detect.
+    """
+    words = get_words_cached(db)
+    if not words:
+        return None
+    return DetectorService.build_matcher(words)
@@ -0,0 +1,149 @@
+# Copyright (C) 2024 Mustafa Naseer
+#
+# This file is part of Movie Profanity Detector application.
+#
+# Movie Profanity Detector is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation version 3 of the License.
+#
+# Movie Profanity Detector is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Movie Profanity Detector. If not, see <http://www.gnu.org/licenses/>.
+
+# Import necessary modules and dependencies
+import asyncio
+import os
+import tempfile
+import unittest
+from concurrent.futures import Executor, ThreadPoolExecutor
+from unittest import mock
+from app.services.detector import DetectorService, MAX_OUTPUTS_PER_FFMPEG, PARALLEL_SCAN_MIN_CUES, settings
+
+
+# Tests for the audio segment extraction of DetectorService (FFmpeg itself is not run)
+class ExtractAudioSegmentsTest(unittest.TestCase):
+
+    def extract(self, detections):
+        # Record the FFmpeg commands instead of running them
+        commands = []
+
+        async def run_ffmpeg(command, *args, **kwargs):
+            commands.append(command)
+
+        with mock.patch.object(DetectorService, "run_ffmpeg", side_effect=run_ffmpeg):
+            segments = asyncio.run(DetectorService.extract_audio_segments("movie.mp4", detections, "movie"))
+        return segments, commands
+
+    def test_skips_zero_length_and_inverted_cues(self):
+        detections = [
+            {"word": "damn", "start_time": "00:00:01.000", "stop_time": "00:00:02.000"},
+            {"word": "hell", "start_time": "00:00:05.000", "stop_time": "00:00:05.000"},
+            {"word": "ass", "start_time": "00:00:08.000", "stop_time": "00:00:07.500"},
+        ]
+        segments, commands = self.extract(detections)
+
+        self.assertEqual([segment["word"] for segment in segments], ["damn"])
+        # Every "-ss"/"-to" pair after the input must describe a non-empty segment
+        for command in commands:
+            output_args = command[command.index("-i") + 2:]
+            starts = [float(output_args[i + 1]) for i, arg in enumerate(output_args) if arg == "-ss"]
+            stops = [float(output_args[i + 1]) for i, arg in enumerate(output_args) if arg == "-to"]
+            self.assertTrue(all(stop > start for start, stop in zip(starts, stops)))
+
+    def test_only_empty_cues_runs_no_ffmpeg(self):
+        detections = [{"word": "hell", "start_time": "00:00:05.000", "stop_time": "00:00:05.000"}]
+        segments, commands = self.extract(detections)
+
+        self.assertEqual(segments, [])
+        self.assertEqual(commands, [])
+
+    def test_caps_outputs_per_ffmpeg_process(self):
+        detections = [
+            {"word": "damn", "start_time": f"00:{index // 60:02d}:{index % 60:02d}.000",
+             "stop_time": f"00:{index // 60:02d}:{index % 60:02d}.500"}
+            for index in range(MAX_OUTPUTS_PER_FFMPEG * 3 + 1)
+        ]
+        segments, commands = self.extract(detections)
+
+        self.assertEqual(len(segments), len(detections))
+        self.assertGreaterEqual(len(commands), 4)
+        for command in commands:
+            self.assertLessEqual(command.count("-to"), MAX_OUTPUTS_PER_FFMPEG)
+
+    def test_runs_in_several_event_loops(self):
+        # Fake FFmpeg process that yields to the event loop, so the batches have to wait on the semaphore
+        class FakeProcess:
+            returncode = 0
+
+            async def communicate(self):
+                await asyncio.sleep(0.001)
+                return b"", b""
+
+        async def create_subprocess_exec(*args, **kwargs):
+            return FakeProcess()
+
+        detections = [
+            {"word": "damn", "start_time": f"00:00:{index:02d}.000", "stop_time": f"00:00:{index:02d}.500"}
+            for index in range(10)
+        ]
+        with mock.patch("asyncio.create_subprocess_exec", side_effect=create_subprocess_exec), \
+                mock.patch.object(settings, "FFMPEG_WORKERS", 2), \
+                mock.patch("app.services.detector.MAX_OUTPUTS_PER_FFMPEG", 1):
+            for _ in range(2):
+                segments = asyncio.run(DetectorService.extract_audio_segments("movie.mp4", detections, "movie"))
+                self.assertEqual(len(segments), len(detections))
+
+
+# Executor that records the calls it gets and runs them in the calling thread
+class RecordingPool(Executor):
+
+    def __init__(self, max_workers):
+        self._max_workers = max_workers
+        self.calls = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.calls += 1
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(fn, *args, **kwargs)
+
+
+# Tests for scanning SRT files with DetectorService.check_srt_async
+class CheckSrtAsyncTest(unittest.TestCase):
+
+    def setUp(self):
+        # SRT file large enough for the process pool path, every cue holds one profanity word
+        srt_file = tempfile.NamedTemporaryFile("w", suffix=".srt", delete=False, encoding="utf-8")
+        with srt_file:
+            for index in range(PARALLEL_SCAN_MIN_CUES):
+                srt_file.write(f"{index + 1}\n{index // 3600:02d}:{index // 60 % 60:02d}:{index % 60:02d},000 --> "
+                               f"{index // 3600:02d}:{index // 60 % 60:02d}:{index % 60:02d},500\nline damn {index}\n\n")
+        self.srt_path = srt_file.name
+        self.matcher = DetectorService.build_matcher(["damn"])
+
+    def tearDown(self):
+        os.remove(self.srt_path)
+
+    def scan(self, scan_pool):
+        return asyncio.run(DetectorService.check_srt_async(self.srt_path, self.matcher, None, scan_pool))
+
+    def test_single_worker_pool_is_not_used(self):
+        scan_pool = RecordingPool(max_workers=1)
+        detections = self.scan(scan_pool)
+
+        self.assertEqual(scan_pool.calls, 0)
+        self.assertEqual(len(detections), PARALLEL_SCAN_MIN_CUES)
+
+    def test_chunks_follow_the_pool_size(self):
+        scan_pool = RecordingPool(max_workers=3)
+        detections = self.scan(scan_pool)
+
+        self.assertEqual(scan_pool.calls, 3)
+        self.assertEqual(detections, self.scan(None))
+
+
+if __name__ == "__main__":
+    unittest.main()